@@ -1,6 +1,7 @@
 import os
 import sys
 import json
+import time
 import logging
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -68,10 +69,15 @@ except ImportError:
         def fetch_realty_properties():
             return []
 
+from query_log import QueryLog
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Only /tmp is writable inside Vercel functions
+query_log = QueryLog(os.getenv('QUERY_LOG_PATH', '/tmp/query_log.jsonl'))
+
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'YOUR_GEMINI_API_KEY_HERE')
 genai.configure(api_key=GEMINI_API_KEY)
@@ -222,7 +228,11 @@ def handler(event, context):
                 })
             }
         
+        search_started = time.perf_counter()
+        timings = {}
+        
         # Generate SQL query using Gemini
+        started = time.perf_counter()
         try:
             sql_query = generate_sql_query(user_query, DB_STRUCTURE, PROMPT)
             logger.info(f"Generated SQL query: {sql_query}")
@@ -242,8 +252,10 @@ def handler(event, context):
         
         # Clean the SQL query (remove markdown code blocks if present)
         cleaned_sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
+        timings['translate'] = (time.perf_counter() - started) * 1000
         
         # Execute SQL query to get results from database
+        started = time.perf_counter()
         try:
             sql_results = execute_sql_query(cleaned_sql_query)
             logger.info(f"Executed SQL query successfully, got {len(sql_results)} results")
@@ -261,14 +273,20 @@ def handler(event, context):
                 })
             }
         
+        timings['execute'] = (time.perf_counter() - started) * 1000
+        
         # Fetch RealtyFeed properties once for image matching
+        started = time.perf_counter()
         try:
             realty_properties = fetch_realty_properties()
         except Exception as e:
             logger.warning(f"Error fetching RealtyFeed properties: {str(e)}")
             realty_properties = []
         
+        timings['media'] = (time.perf_counter() - started) * 1000
+        
         # Transform results to property format
+        started = time.perf_counter()
         try:
             transformed_properties = transform_sql_results_to_properties(sql_results, realty_properties)
         except Exception as e:
@@ -285,7 +303,11 @@ def handler(event, context):
                 })
             }
         
+        timings['transform'] = (time.perf_counter() - started) * 1000
+        
         count = len(transformed_properties)
+        timings['total'] = (time.perf_counter() - search_started) * 1000
+        query_log.record(user_query, cleaned_sql_query, count, timings)
         
         message = ""
         lower_query = user_query.lower()
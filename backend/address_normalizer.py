@@ -0,0 +1,141 @@
+"""
+Batched address parsing and normalization.
+
+All addresses in a result set are parsed together with one compiled regex
+through pandas' vectorized string methods. Each address is split into street
+number, street name, unit, city, state and postal code, with street suffixes,
+unit designators and state names converted to their canonical USPS
+abbreviations. The derived match key, which includes the unit, is shared by
+the Property fields and the RealtyFeed image matching.
+"""
+import re
+import pandas as pd
+
+US_STATES = {
+    'alabama': 'AL', 'alaska': 'AK', 'arizona': 'AZ', 'arkansas': 'AR', 'california': 'CA',
+    'colorado': 'CO', 'connecticut': 'CT', 'delaware': 'DE', 'district of columbia': 'DC',
+    'florida': 'FL', 'georgia': 'GA', 'hawaii': 'HI', 'idaho': 'ID', 'illinois': 'IL',
+    'indiana': 'IN', 'iowa': 'IA', 'kansas': 'KS', 'kentucky': 'KY', 'louisiana': 'LA',
+    'maine': 'ME', 'maryland': 'MD', 'massachusetts': 'MA', 'michigan': 'MI', 'minnesota': 'MN',
+    'mississippi': 'MS', 'missouri': 'MO', 'montana': 'MT', 'nebraska': 'NE', 'nevada': 'NV',
+    'new hampshire': 'NH', 'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY',
+    'north carolina': 'NC', 'north dakota': 'ND', 'ohio': 'OH', 'oklahoma': 'OK', 'oregon': 'OR',
+    'pennsylvania': 'PA', 'rhode island': 'RI', 'south carolina': 'SC', 'south dakota': 'SD',
+    'tennessee': 'TN', 'texas': 'TX', 'utah': 'UT', 'vermont': 'VT', 'virginia': 'VA',
+    'washington': 'WA', 'west virginia': 'WV', 'wisconsin': 'WI', 'wyoming': 'WY',
+    'puerto rico': 'PR',
+}
+
+STREET_SUFFIXES = {
+    'alley': 'Aly', 'avenue': 'Ave', 'av': 'Ave', 'boulevard': 'Blvd', 'circle': 'Cir',
+    'court': 'Ct', 'cove': 'Cv', 'crossing': 'Xing', 'drive': 'Dr', 'expressway': 'Expy',
+    'freeway': 'Fwy', 'highway': 'Hwy', 'lane': 'Ln', 'loop': 'Loop', 'parkway': 'Pkwy',
+    'place': 'Pl', 'plaza': 'Plz', 'point': 'Pt', 'road': 'Rd', 'square': 'Sq', 'street': 'St',
+    'str': 'St', 'terrace': 'Ter', 'trail': 'Trl', 'way': 'Way',
+}
+# Already-abbreviated suffixes map to themselves so casing is canonical too
+STREET_SUFFIXES.update({abbreviation.lower(): abbreviation for abbreviation in set(STREET_SUFFIXES.values())})
+
+_STATE_LOOKUP = dict(US_STATES)
+_STATE_LOOKUP.update({code.lower(): code for code in US_STATES.values()})
+
+# Longest names first so "West Virginia" wins over "Virginia"
+_STATE_PATTERN = '|'.join(
+    re.escape(name).replace(r'\ ', r'\s+') for name in sorted(_STATE_LOOKUP, key=len, reverse=True)
+)
+
+# Secondary unit designators with their canonical USPS forms
+UNIT_DESIGNATORS = {
+    'apartment': 'Apt', 'apt': 'Apt', 'building': 'Bldg', 'bldg': 'Bldg', 'department': 'Dept',
+    'dept': 'Dept', 'floor': 'Fl', 'fl': 'Fl', 'lot': 'Lot', 'room': 'Rm', 'rm': 'Rm',
+    'space': 'Spc', 'spc': 'Spc', 'suite': 'Ste', 'ste': 'Ste', 'trailer': 'Trlr', 'trlr': 'Trlr',
+    'unit': 'Unit',
+}
+_DESIGNATOR_PATTERN = '|'.join(sorted(UNIT_DESIGNATORS, key=len, reverse=True))
+# A designator must be followed by an identifier that starts with a digit or is a single
+# letter, so street words such as "Floral" or "Lotus" are never read as units
+_UNIT_PATTERN = rf"""(?:
+    (?:{_DESIGNATOR_PATTERN})\.?\s*\#?\s*(?:\d[\w-]*|[A-Za-z](?:-?\d+)?\b)
+    |\#\s*[\w-]+
+)"""
+_ZIP_PATTERN = r'\d{5}(?:-\d{4})?'
+_STATE_CODE_PATTERN = '(?-i:' + '|'.join(sorted(set(US_STATES.values()))) + ')'
+_COUNTRY_PATTERN = r'(?:\s*,\s*(?:usa|us|united\s+states))?'
+
+ADDRESS_RE = re.compile(rf"""
+    ^\s*
+    (?:(?P<street_number>\d+[A-Za-z]?(?:-\d+)?)\s+)?
+    (?P<street_name>[^,]+?)
+    (?:(?:\s*,\s*|\s+)(?P<unit>{_UNIT_PATTERN}(?:(?:\s*,\s*|\s+){_UNIT_PATTERN})*))?
+    (?:\s*,\s*(?P<city>[^,]+?)
+        # Without a comma a trailing state is only split off the city when a ZIP follows
+        # it, or when it is an uppercase code ending the address ("Beaufort SC"), so
+        # cities such as "Port Washington" stay whole
+        (?:(?:\s*,\s*|\s+(?=
+            (?:{_STATE_PATTERN})\.?\s*,?\s*{_ZIP_PATTERN}
+            |{_STATE_CODE_PATTERN}\b{_COUNTRY_PATTERN}\s*$
+        ))(?P<state>{_STATE_PATTERN})\b\.?)?
+    )?
+    (?:\s*,?\s*(?P<postal_code>{_ZIP_PATTERN}))?
+    {_COUNTRY_PATTERN}
+    \s*$
+""", re.IGNORECASE | re.VERBOSE)
+
+# Rows the full pattern rejects fall back to the original comma split
+FALLBACK_ADDRESS_RE = re.compile(r"""
+    ^\s*
+    (?:(?P<street_number>[^\s,]+)\s+)?
+    (?P<street_name>[^,]*?)
+    \s*(?:,\s*(?P<city>[^,]*?)\s*(?:,.*)?)?$
+""", re.VERBOSE)
+
+_SUFFIX_RE = re.compile(rf"\b({'|'.join(map(re.escape, STREET_SUFFIXES))})\.?$", re.IGNORECASE)
+_DESIGNATOR_RE = re.compile(rf"\b({_DESIGNATOR_PATTERN})\b\.?\s*", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+ADDRESS_FIELDS = ['street_number', 'street_name', 'unit', 'city', 'state', 'postal_code', 'match_key']
+
+
+def normalize_addresses(addresses):
+    """
+    Parse a batch of unparsed addresses in one vectorized pass.
+    Returns one dict of ADDRESS_FIELDS per input address, in input order.
+    """
+    if not addresses:
+        return []
+
+    raw = pd.Series(list(addresses), dtype='object').fillna('').astype(str)
+    collapsed = raw.str.replace(_WHITESPACE_RE, ' ', regex=True).str.strip()
+    parts = collapsed.str.extract(ADDRESS_RE).fillna('')
+
+    # Addresses the pattern rejects are never parsed worse than a plain comma split
+    unmatched = (parts['street_name'] == '') & (collapsed != '')
+    if unmatched.any():
+        fallback = collapsed[unmatched].str.extract(FALLBACK_ADDRESS_RE).fillna('')
+        for field in ['street_number', 'street_name', 'city']:
+            parts.loc[unmatched, field] = fallback[field]
+
+    parts['street_name'] = parts['street_name'].str.replace(
+        _SUFFIX_RE, lambda m: STREET_SUFFIXES[m.group(1).lower()], regex=True
+    )
+    parts['unit'] = parts['unit'].str.replace(
+        _DESIGNATOR_RE, lambda m: UNIT_DESIGNATORS[m.group(1).lower()] + ' ', regex=True
+    ).str.replace(r'#\s*', '#', regex=True).str.replace(r'\s*,\s*', ' ', regex=True).str.strip()
+    parts['state'] = (
+        parts['state'].str.lower().str.replace(_WHITESPACE_RE, ' ', regex=True)
+        .map(_STATE_LOOKUP).fillna('')
+    )
+
+    # The key keeps only unit identifiers, so "Apt 2", "Unit 2" and "#2" match each other
+    # while different units in one building never share a key
+    unit_key = (
+        parts['unit'].str.replace(_DESIGNATOR_RE, '', regex=True).str.lower()
+        .str.replace(r'[^\w]+', ' ', regex=True).str.strip()
+    )
+    street_key = (
+        (parts['street_number'] + ' ' + parts['street_name']).str.strip().str.lower()
+        .str.replace(r'[^\w ]', '', regex=True)
+    )
+    parts['match_key'] = (street_key + ' ' + unit_key).str.strip()
+
+    return parts[ADDRESS_FIELDS].to_dict('records')
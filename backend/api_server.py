@@ -1,15 +1,20 @@
 # first run "python backend/api_server.py"
 import os
+import time
 import atexit
+import threading
+from collections import OrderedDict
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import google.generativeai as genai
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam
 from dotenv import load_dotenv
 import requests
 from google.cloud.sql.connector import Connector, IPTypes
 import pytds
+from query_log import QueryLog, normalize_query
+from address_normalizer import normalize_addresses
 
 # Load environment variables
 load_dotenv()
@@ -41,8 +46,20 @@ missing_cloud_sql_vars = [
 if missing_cloud_sql_vars:
     raise RuntimeError(f"Missing required Cloud SQL environment variables: {', '.join(missing_cloud_sql_vars)}")
 
-# Initialize Cloud SQL connector
-connector = Connector()
+# Connection pool settings tuned for Cloud SQL. Each worker process owns its own pool,
+# so the instance sees at most workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '2'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Recycle well before Cloud SQL drops idle connections
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+# The Cloud SQL connector runs a background event loop thread that does not survive
+# fork(), so pre-fork servers set API_SERVER_DEFER_DB_INIT and call init_worker()
+# in each worker instead of connecting at import time.
+connector = None
+engine = None
+database_connected = False
 
 def getconn():
     """
@@ -58,28 +75,115 @@ def getconn():
         ip_type=CLOUD_SQL_IP_TYPE,
     )
 
-# Create engine with pytds through the Cloud SQL Connector
-engine = None
-database_connected = False
+def create_database_engine():
+    """Create the Cloud SQL connector and pooled engine for the current process without connecting"""
+    global connector, engine
 
-try:
+    connector = Connector()
+    # Create engine with pytds through the Cloud SQL Connector
     engine = create_engine(
         "mssql+pytds://",
         creator=getconn,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
     )
-    # Test the connection
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-    database_connected = True
-    print("Successfully connected using Google Cloud SQL Connector with pytds")
-except Exception as e:
-    print(f"Failed to connect using Google Cloud SQL Connector with pytds: {e}")
-    # If connection fails, raise an error since we don't want to use mock data
-    raise RuntimeError("Database connection failed. Please check your database configuration.")
-
-# Ensure connector closes when the app exits
-if database_connected:
-    atexit.register(connector.close)
+
+def close_connector():
+    """Close the current process's connector, if it still has one"""
+    if connector is not None:
+        connector.close()
+
+# Ensure connector closes when the process exits
+atexit.register(close_connector)
+
+def init_database():
+    """Create the engine and fail fast if the database cannot be reached"""
+    global database_connected
+
+    try:
+        create_database_engine()
+        # Test the connection
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        database_connected = True
+        print(f"[pid {os.getpid()}] Successfully connected using Google Cloud SQL Connector with pytds")
+    except Exception as e:
+        print(f"Failed to connect using Google Cloud SQL Connector with pytds: {e}")
+        # If connection fails, raise an error since we don't want to use mock data
+        raise RuntimeError("Database connection failed. Please check your database configuration.")
+
+def check_database_connection():
+    """
+    Strict startup check for the pre-fork master. The connector and engine are torn
+    down again afterwards, because the connector's event loop thread cannot be forked.
+    """
+    global connector, engine, database_connected
+
+    init_database()
+    engine.dispose()
+    connector.close()
+    connector = None
+    engine = None
+    database_connected = False
+
+def wait_for_database(max_delay=30):
+    """Retry the connection with capped exponential backoff until the database answers"""
+    global database_connected
+
+    delay = 1
+    while True:
+        try:
+            if engine is None:
+                create_database_engine()
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            database_connected = True
+            return
+        except Exception as e:
+            print(f"[pid {os.getpid()}] Database not reachable yet, retrying in {delay}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+def warm_up_worker(prewarm_top_n):
+    """Open the pooled connections up front and prewarm the caches from the query log"""
+    wait_for_database()
+
+    connections = []
+    try:
+        for _ in range(DB_POOL_SIZE):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            connections.append(conn)
+    except Exception as e:
+        print(f"[pid {os.getpid()}] Connection pool warm-up stopped early: {e}")
+    finally:
+        # Returning the connections leaves them idle in the pool for the first requests
+        for conn in connections:
+            conn.close()
+
+    if prewarm_top_n > 0:
+        prewarm_caches(prewarm_top_n)
+
+def init_worker():
+    """
+    Per-worker initialization for pre-fork servers, called after fork. Never raises:
+    the master already checked the database at startup, so a brief outage while a
+    worker is recycled is retried in the background instead of halting the server.
+    """
+    try:
+        create_database_engine()
+    except Exception as e:
+        # wait_for_database() retries creating the engine in the background
+        print(f"[pid {os.getpid()}] Failed to create database engine, retrying in the background: {e}")
+    prewarm_top_n = int(os.getenv('QUERY_PREWARM_TOP_N', '20'))
+    # Warm in the background so the worker starts accepting requests immediately
+    threading.Thread(target=warm_up_worker, args=(prewarm_top_n,), daemon=True).start()
+
+if os.getenv('API_SERVER_DEFER_DB_INIT', 'false').lower() != 'true':
+    init_database()
 
 # Database structure
 DB_STRUCTURE = """
@@ -128,34 +232,135 @@ def fetch_realty_properties():
         print(f"Error fetching RealtyFeed properties: {str(e)}")
         return []
 
-def find_property_images(address, realty_properties):
-    """Find property images from RealtyFeed properties by matching address"""
-    if not address or not realty_properties:
-        return []
-    
-    # Normalize address for comparison
-    normalized_address = address.lower().strip()
-    
-    # Try to find matching property
+def normalize_property_addresses(property_ids, unparsed_addresses):
+    """
+    Return normalized address components for a result set, memoized per property_id.
+    Addresses not already cached are parsed together in a single batch.
+    """
+    normalized = [None] * len(property_ids)
+    pending = []
+    for index, (property_id, unparsed_address) in enumerate(zip(property_ids, unparsed_addresses)):
+        cached = address_cache.get(property_id) if property_id else None
+        # Re-parse if the listing's address changed since it was cached
+        if cached is not None and cached[0] == unparsed_address:
+            normalized[index] = cached[1]
+        else:
+            pending.append(index)
+
+    if pending:
+        parsed = normalize_addresses([unparsed_addresses[index] for index in pending])
+        for index, address in zip(pending, parsed):
+            normalized[index] = address
+            if property_ids[index]:
+                address_cache.set(property_ids[index], (unparsed_addresses[index], address))
+
+    return normalized
+
+def build_realty_media_index(realty_properties):
+    """Index RealtyFeed media by normalized street and unit key, parsing all addresses in one batch"""
+    candidates = []
     for prop in realty_properties:
+        media = prop.get('Media', [])
+        if not media or not isinstance(media, list):
+            continue
         prop_address = prop.get('UnparsedAddress', '')
         if not prop_address:
             # Construct address from parts
-            parts = [
-                prop.get('StreetNumber'),
-                prop.get('StreetName'),
-                prop.get('City'),
-                prop.get('StateOrProvince')
-            ]
-            prop_address = ' '.join([str(p) for p in parts if p])
-        
-        if prop_address and normalized_address in prop_address.lower():
-            media = prop.get('Media', [])
-            if media and isinstance(media, list):
-                return media
+            unit = f"#{prop.get('UnitNumber')}" if prop.get('UnitNumber') else None
+            street = ' '.join(str(p) for p in [prop.get('StreetNumber'), prop.get('StreetName'), unit] if p)
+            prop_address = ', '.join(str(p) for p in [street, prop.get('City'), prop.get('StateOrProvince')] if p)
+        if prop_address:
+            candidates.append((prop_address, media))
+
+    media_index = {}
+    parsed = normalize_addresses([prop_address for prop_address, _ in candidates])
+    for address, (_, media) in zip(parsed, candidates):
+        if address['match_key']:
+            media_index.setdefault(address['match_key'], []).append((address['city'].lower(), media))
+    return media_index
+
+def find_property_images(address, media_index):
+    """Find property images by matching a normalized address against the RealtyFeed media index"""
+    if not address or not address['match_key'] or not media_index:
+        return []
+    
+    # Keys include the unit, so a condo only matches its own unit, and a
+    # unit-less address only matches other unit-less addresses
+    city = address['city'].lower()
+    for candidate_city, media in media_index.get(address['match_key'], []):
+        # Same street key in a different city is a different property
+        if not city or not candidate_city or city == candidate_city:
+            return media
     
     return []
 
+class LRUCache:
+    """Small thread-safe LRU cache with an optional time-to-live per entry"""
+
+    def __init__(self, max_size, ttl_seconds=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+# Natural language -> SQL translations never go stale; query results expire
+translation_cache = LRUCache(int(os.getenv('TRANSLATION_CACHE_SIZE', '512')))
+result_cache = LRUCache(
+    int(os.getenv('RESULT_CACHE_SIZE', '256')),
+    ttl_seconds=float(os.getenv('RESULT_CACHE_TTL_SECONDS', '900')),
+)
+
+# Transformed Property objects keyed by property_id for the bulk details endpoint. Only filled
+# from its own SELECT *, never from search rows, whose Gemini-written SQL may drop columns.
+listing_cache = LRUCache(
+    int(os.getenv('LISTING_CACHE_SIZE', '2048')),
+    ttl_seconds=float(os.getenv('LISTING_CACHE_TTL_SECONDS', '900')),
+)
+
+# SQL Server allows at most 2100 parameters per statement
+MAX_BULK_PROPERTY_IDS = 200
+# Ids are bound as integers; anything outside BIGINT is rejected before reaching SQL Server
+MAX_PROPERTY_ID = 2 ** 63 - 1
+PROPERTY_DETAILS_QUERY = text(
+    "SELECT * FROM Properties WHERE property_id IN :property_ids"
+).bindparams(bindparam('property_ids', expanding=True))
+
+# Fields the search results list and map markers need before details are loaded
+SUMMARY_FIELDS = [
+    'ListingKey', 'ListingId', 'ListPrice', 'UnparsedAddress', 'StreetNumber', 'StreetName', 'City',
+    'StateOrProvince', 'PostalCode', 'BedroomsTotal', 'BathroomsTotalInteger', 'LivingArea', 'Latitude', 'Longitude',
+    'PropertyType',
+]
+
+# Parsed address components keyed by property_id, stored with the raw address they came from
+address_cache = LRUCache(int(os.getenv('ADDRESS_CACHE_SIZE', '4096')))
+
+query_log = QueryLog()
+atexit.register(query_log.close)
+
 def generate_sql_query(user_query, db_structure, prompt):
     """Generate SQL query using Gemini LLM"""
     try:
@@ -169,7 +374,8 @@ def generate_sql_query(user_query, db_structure, prompt):
 
 def execute_sql_query(sql_query):
     """Execute SQL query and return results as list of dictionaries"""
-    if not database_connected or engine is None:
+    # A worker whose first connect failed still serves; pool_pre_ping reconnects once Cloud SQL is back
+    if engine is None:
         raise Exception("Database connection not available. Please check your database configuration.")
     
     try:
@@ -180,6 +386,58 @@ def execute_sql_query(sql_query):
     except Exception as e:
         raise Exception(f"Error executing SQL query: {str(e)}")
 
+def run_search(user_query):
+    """
+    Translate and execute a natural language query through the caches.
+    Returns the cleaned SQL, the raw rows and the stage timings in milliseconds.
+    """
+    normalized_query = normalize_query(user_query)
+    timings = {}
+
+    started = time.perf_counter()
+    cleaned_sql_query = translation_cache.get(normalized_query)
+    translation_cached = cleaned_sql_query is not None
+    if not translation_cached:
+        # Generate SQL query using Gemini
+        sql_query = generate_sql_query(user_query, DB_STRUCTURE, PROMPT)
+        # Clean the SQL query (remove markdown code blocks if present)
+        cleaned_sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
+    timings['translate'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    sql_results = result_cache.get(cleaned_sql_query)
+    results_cached = sql_results is not None
+    if not results_cached:
+        try:
+            # Execute SQL query to get results from database
+            sql_results = execute_sql_query(cleaned_sql_query)
+        except Exception:
+            # Never keep SQL that fails to execute; the next retry asks Gemini again
+            translation_cache.delete(normalized_query)
+            raise
+        result_cache.set(cleaned_sql_query, sql_results)
+    timings['execute'] = (time.perf_counter() - started) * 1000
+
+    # Only cache translations whose SQL is known to execute
+    if not translation_cached:
+        translation_cache.set(normalized_query, cleaned_sql_query)
+
+    cache_hits = {'translation': translation_cached, 'results': results_cached}
+    return cleaned_sql_query, sql_results, timings, cache_hits
+
+def prewarm_caches(top_n):
+    """Replay the most frequent logged queries to fill the translation and result caches"""
+    warmed = 0
+    for normalized_query, sql, count in query_log.top_queries(top_n):
+        try:
+            result_cache.set(sql, execute_sql_query(sql))
+            translation_cache.set(normalized_query, sql)
+            warmed += 1
+        except Exception as e:
+            print(f"Skipping prewarm for '{normalized_query}': {e}")
+    print(f"Prewarmed caches with {warmed} popular queries")
+    return warmed
+
 def transform_sql_results_to_properties(sql_results, realty_properties=None):
     """Transform SQL query results directly to Property format matching frontend interface"""
     transformed_properties = []
@@ -206,6 +464,8 @@ def transform_sql_results_to_properties(sql_results, realty_properties=None):
             'StreetNumber': '',
             'StreetName': '',
             'City': '',
+            'StateOrProvince': '',
+            'PostalCode': '',
             'BedroomsTotal': int(get_value(['bedrooms', 'BEDROOMS'], 0)) if get_value(['bedrooms', 'BEDROOMS']) else 0,
             'BathroomsTotalInteger': int(get_value(['bathrooms', 'BATHROOMS'], 0)) if get_value(['bathrooms', 'BATHROOMS']) else 0,
             'LivingArea': float(get_value(['square_footage', 'SQUARE_FOOTAGE'], 0)) if get_value(['square_footage', 'SQUARE_FOOTAGE']) else 0,
@@ -217,40 +477,82 @@ def transform_sql_results_to_properties(sql_results, realty_properties=None):
             'PropertyType': str(get_value(['property_type', 'PROPERTY_TYPE'], '')),
         }
         
-        # Parse address if available
-        unparsed_address = transformed['UnparsedAddress']
-        if unparsed_address:
-            address_parts = unparsed_address.split(',')
-            if len(address_parts) >= 1:
-                street_parts = address_parts[0].strip().split(' ', 1)
-                if len(street_parts) >= 2:
-                    transformed['StreetNumber'] = street_parts[0]
-                    transformed['StreetName'] = street_parts[1]
-            if len(address_parts) >= 2:
-                transformed['City'] = address_parts[1].strip()
+        transformed_properties.append(transformed)
+    
+    # Parse every address in the result set in one batch, then match images on the same keys
+    addresses = normalize_property_addresses(
+        [transformed['ListingKey'] for transformed in transformed_properties],
+        [transformed['UnparsedAddress'] for transformed in transformed_properties],
+    )
+    media_index = build_realty_media_index(realty_properties)
+    
+    for transformed, address in zip(transformed_properties, addresses):
+        transformed['StreetNumber'] = address['street_number']
+        transformed['StreetName'] = address['street_name']
+        transformed['City'] = address['city']
+        transformed['StateOrProvince'] = address['state']
+        transformed['PostalCode'] = address['postal_code']
         
         # Find images from RealtyFeed API by matching address
-        unparsed_address = transformed['UnparsedAddress']
-        if unparsed_address:
-            images = find_property_images(unparsed_address, realty_properties)
-            if images:
-                transformed['Media'] = images
-            else:
-                # Fallback to placeholder if no images found
-                transformed['Media'] = [{
-                    'MediaURL': f'https://via.placeholder.com/400x300?text=No+Image+Available'
-                }]
+        images = find_property_images(address, media_index)
+        if images:
+            transformed['Media'] = images
         else:
-            # Add placeholder image if no address available
+            # Fallback to placeholder if no images found
             transformed['Media'] = [{
                 'MediaURL': f'https://via.placeholder.com/400x300?text=No+Image+Available'
             }]
-        
-        transformed_properties.append(transformed)
     
     return transformed_properties
 
 
+def parse_property_id(value):
+    """Return the canonical string form of an integer property id, or None if it is not one"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not (value.isascii() and value.isdecimal()):
+            return None
+        value = int(value)
+    if not isinstance(value, int) or not 0 <= value <= MAX_PROPERTY_ID:
+        return None
+    return str(value)
+
+def fetch_property_details(property_ids):
+    """
+    Return transformed properties for the given ids in request order, serving
+    cached listings and loading the rest with one batched IN (...) query.
+    """
+    properties = {}
+    missing_ids = []
+    for property_id in property_ids:
+        cached = listing_cache.get(property_id)
+        if cached is not None:
+            properties[property_id] = cached
+        else:
+            missing_ids.append(property_id)
+
+    if missing_ids:
+        if engine is None:
+            raise Exception("Database connection not available. Please check your database configuration.")
+        try:
+            with engine.connect() as connection:
+                result = connection.execute(
+                    PROPERTY_DETAILS_QUERY, {'property_ids': [int(property_id) for property_id in missing_ids]}
+                )
+                df = pd.DataFrame(result.fetchall(), columns=result.keys())
+                sql_results = df.to_dict('records')
+        except Exception as e:
+            raise Exception(f"Error fetching property details: {str(e)}")
+
+        for transformed in transform_sql_results_to_properties(sql_results):
+            listing_cache.set(transformed['ListingKey'], transformed)
+            properties[transformed['ListingKey']] = transformed
+
+    return [properties[property_id] for property_id in property_ids if property_id in properties]
+
+
 @app.route('/api/search', methods=['POST'])
 def search():
     """Handle natural language search requests"""
@@ -265,23 +567,30 @@ def search():
         if not user_query:
             return jsonify({'error': 'Query cannot be empty'}), 400
         
-        # Generate SQL query using Gemini
-        sql_query = generate_sql_query(user_query, DB_STRUCTURE, PROMPT)
+        # 'summary' returns only list/map fields; details and media come from /api/properties
+        summary_only = data.get('fields') == 'summary'
         
-        # Clean the SQL query (remove markdown code blocks if present)
-        cleaned_sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-        
-        # Execute SQL query to get results from database
-        sql_results = execute_sql_query(cleaned_sql_query)
+        search_started = time.perf_counter()
+        cleaned_sql_query, sql_results, timings, cache_hits = run_search(user_query)
         
         # Fetch RealtyFeed properties once for image matching
-        realty_properties = fetch_realty_properties()
+        started = time.perf_counter()
+        realty_properties = [] if summary_only else fetch_realty_properties()
+        timings['media'] = (time.perf_counter() - started) * 1000
         
         # Transform SQL results directly to Property format (properties are already listed in database)
         # Pass realty_properties to avoid fetching multiple times
+        started = time.perf_counter()
         transformed_properties = transform_sql_results_to_properties(sql_results, realty_properties)
+        if summary_only:
+            transformed_properties = [
+                {field: prop[field] for field in SUMMARY_FIELDS} for prop in transformed_properties
+            ]
+        timings['transform'] = (time.perf_counter() - started) * 1000
         
         count = len(transformed_properties)
+        timings['total'] = (time.perf_counter() - search_started) * 1000
+        query_log.record(user_query, cleaned_sql_query, count, timings, cached=cache_hits)
         
         message = ""
         lower_query = user_query.lower()
@@ -306,12 +615,58 @@ def search():
             'error': str(e)
         }), 500
 
+@app.route('/api/properties', methods=['POST'])
+def properties():
+    """Return details and media for a batch of property ids"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'property_ids' not in data:
+            return jsonify({'error': 'Missing property_ids parameter'}), 400
+        
+        requested_ids = data['property_ids']
+        if not isinstance(requested_ids, list):
+            return jsonify({'error': 'property_ids must be a list'}), 400
+        
+        # Reject ids SQL Server could not compare with the integer property_id column
+        invalid_ids = [property_id for property_id in requested_ids if parse_property_id(property_id) is None]
+        if invalid_ids:
+            return jsonify({'error': 'property_ids must be non-negative integers', 'invalid': invalid_ids}), 400
+        
+        # Deduplicate while keeping the caller's order
+        property_ids = list(dict.fromkeys(parse_property_id(property_id) for property_id in requested_ids))
+        
+        if len(property_ids) > MAX_BULK_PROPERTY_IDS:
+            return jsonify({'error': f'At most {MAX_BULK_PROPERTY_IDS} property_ids can be requested at once'}), 400
+        
+        results = fetch_property_details(property_ids) if property_ids else []
+        found_ids = {prop['ListingKey'] for prop in results}
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'count': len(results),
+            'missing': [property_id for property_id in property_ids if property_id not in found_ids]
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'service': 'Real Estate Search API', 'database_connected': database_connected})
 
 if __name__ == '__main__':
+    # Development server only; use "gunicorn -c backend/gunicorn.conf.py" in production.
+    # With the debug reloader only the serving child process should warm up.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        prewarm_top_n = int(os.getenv('QUERY_PREWARM_TOP_N', '20'))
+        threading.Thread(target=warm_up_worker, args=(prewarm_top_n,), daemon=True).start()
+
     print("Starting Real Estate Search API server...")
     print("Server running on http://localhost:5000")
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,45 @@
+# Production serving profile: gunicorn -c backend/gunicorn.conf.py
+import os
+import multiprocessing
+
+# The app is imported once in the master and forked; database connections are
+# opened per worker in post_fork because the Cloud SQL connector cannot be forked.
+os.environ.setdefault('API_SERVER_DEFER_DB_INIT', 'true')
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = 'api_server:app'
+preload_app = True
+
+bind = os.getenv('API_SERVER_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('API_SERVER_WORKERS', multiprocessing.cpu_count()))
+# Requests spend most of their time waiting on Gemini, SQL Server and RealtyFeed,
+# so each worker serves several threads; keep DB_POOL_SIZE >= API_SERVER_THREADS.
+worker_class = 'gthread'
+threads = int(os.getenv('API_SERVER_THREADS', '4'))
+timeout = int(os.getenv('API_SERVER_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+# Restart workers periodically to bound memory growth from the in-process caches
+max_requests = int(os.getenv('API_SERVER_MAX_REQUESTS', '2000'))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Fail fast in the master if the database is unreachable when the server starts"""
+    import api_server
+    api_server.check_database_connection()
+
+
+def post_fork(server, worker):
+    """
+    Create the connector and engine in the worker, then run its warm-up hook.
+    This must not raise: gunicorn halts the whole server on a worker boot error,
+    and workers are recycled routinely (max_requests).
+    """
+    import api_server
+    api_server.init_worker()
+    server.log.info(f"Worker {worker.pid} created database pool")
@@ -0,0 +1,139 @@
+"""
+Load test for the production serving profile.
+
+Starts gunicorn with an increasing number of workers and measures throughput
+against a running endpoint, so scaling across cores can be compared:
+    python backend/load_test.py --workers 1 2 4 8 --duration 20
+
+Use --url to benchmark an already running server instead of launching one.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_QUERIES = [
+    "Show me properties with a pool",
+    "Find 3 bedroom houses under $500,000",
+    "Properties with 4 bedrooms and 2 bathrooms",
+    "Houses near schools in South Carolina",
+]
+
+
+def wait_until_ready(base_url, timeout_seconds=120):
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=2).ok:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_load(base_url, path, concurrency, duration):
+    """Send requests from `concurrency` threads for `duration` seconds"""
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        session = requests.Session()
+        completed, errors, latencies = 0, 0, []
+        request_number = index
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                if path == '/api/search':
+                    query = DEFAULT_QUERIES[request_number % len(DEFAULT_QUERIES)]
+                    # Summary results skip the RealtyFeed media fetch, so throughput reflects
+                    # this server rather than a third-party API
+                    response = session.post(
+                        f"{base_url}{path}", json={'query': query, 'fields': 'summary'}, timeout=60
+                    )
+                else:
+                    response = session.get(f"{base_url}{path}", timeout=60)
+                if response.ok:
+                    completed += 1
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+            request_number += concurrency
+        return completed, errors, latencies
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    completed = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    latencies = sorted(latency for r in results for latency in r[2])
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+    return completed / elapsed, errors, p50, p95
+
+
+def launch_server(workers, port, server_log):
+    env = dict(os.environ, API_SERVER_WORKERS=str(workers), API_SERVER_BIND=f"127.0.0.1:{port}")
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py')],
+        env=env,
+        stdout=server_log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+if __name__ == '__main__':
+    cpu_count = multiprocessing.cpu_count()
+    parser = argparse.ArgumentParser(description='Measure API throughput as gunicorn workers scale')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, max(1, cpu_count // 2), cpu_count}))
+    parser.add_argument('--path', default='/api/search', choices=['/api/search', '/api/health'])
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='client threads (defaults to 4 per worker)')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per run')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--url', default=None, help='benchmark a running server instead of launching one')
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'clients':>8} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'errors':>8}")
+
+    if args.url:
+        concurrency = args.concurrency or 4
+        throughput, errors, p50, p95 = run_load(args.url.rstrip('/'), args.path, concurrency, args.duration)
+        print(f"{'-':>8} {concurrency:>8} {throughput:>10.1f} {p50:>10.1f} {p95:>10.1f} {errors:>8}")
+        sys.exit(0)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    for workers in args.workers:
+        # Keep the server output out of the results table, but show it if the server fails to boot
+        server_log = tempfile.NamedTemporaryFile('w+', prefix='load_test_server_', suffix='.log', delete=False)
+        server = launch_server(workers, args.port, server_log)
+        booted = False
+        try:
+            if not wait_until_ready(base_url):
+                print(f"{workers:>8} server did not become ready; output kept in {server_log.name}:")
+                server_log.flush()
+                server_log.seek(0)
+                print(server_log.read()[-4000:])
+                continue
+            booted = True
+            concurrency = args.concurrency or 4 * workers
+            throughput, errors, p50, p95 = run_load(base_url, args.path, concurrency, args.duration)
+            print(f"{workers:>8} {concurrency:>8} {throughput:>10.1f} {p50:>10.1f} {p95:>10.1f} {errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+            server_log.close()
+            # Only a failed boot leaves its log behind for inspection
+            if booted:
+                os.unlink(server_log.name)
@@ -0,0 +1,207 @@
+"""
+Append-only query log for the natural language search handlers.
+
+Each search is written as one JSON line holding the normalized query, the
+generated SQL, the row count and per-stage timings. The log is rotated by
+size so it never grows without bound, and it is read back at startup to
+prewarm the translation and result caches with the most popular queries.
+
+Offline report of the slowest and most frequent queries:
+    python backend/query_log.py [path/to/query_log.jsonl] [--top N]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:
+    # Windows runs the single-process development server, which needs no cross-process lock
+    fcntl = None
+
+DEFAULT_QUERY_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'query_log.jsonl')
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION_RE = re.compile(r'[\s.?!]+$')
+
+
+def normalize_query(user_query):
+    """Normalize a natural language query so equivalent searches share one key"""
+    normalized = _WHITESPACE_RE.sub(' ', (user_query or '').strip().lower())
+    return _TRAILING_PUNCTUATION_RE.sub('', normalized)
+
+
+class QueryLog:
+    """Thread-safe, size-rotated JSON lines writer for search queries"""
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT):
+        self.path = path or os.getenv('QUERY_LOG_PATH', DEFAULT_QUERY_LOG_PATH)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def _open(self):
+        # Several worker processes append to the same path. Reopen after a fork, and
+        # whenever another process has rotated the file out from under this handle.
+        if self._file is not None:
+            if self._pid == os.getpid() and self._is_current(self._file):
+                return self._file
+            self._file.close()
+            self._file = None
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._pid = os.getpid()
+        return self._file
+
+    def _is_current(self, log_file):
+        """True if the handle still points at the file currently at self.path"""
+        try:
+            return os.stat(self.path).st_ino == os.fstat(log_file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _shared_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            # Mid-rotation in another worker; the next write reopens the new file
+            return 0
+
+    def _rotate(self):
+        log_file, self._file = self._file, None
+        # Serialize rotation across worker processes so two of them never shift the backups twice
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another worker already rotated this file; nothing left to do
+                if not self._is_current(log_file) or self._shared_size() < self.max_bytes:
+                    return
+                for index in range(self.backup_count - 1, 0, -1):
+                    source = f"{self.path}.{index}"
+                    if os.path.exists(source):
+                        os.replace(source, f"{self.path}.{index + 1}")
+                if self.backup_count > 0:
+                    os.replace(self.path, f"{self.path}.1")
+                else:
+                    os.remove(self.path)
+            except FileNotFoundError:
+                # The log was removed outside the writers; the next write recreates it
+                pass
+            finally:
+                log_file.close()
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def record(self, user_query, sql, row_count, timings, **extra):
+        """Append one search to the log; logging failures never break a search"""
+        entry = {
+            'ts': round(time.time(), 3),
+            'query': normalize_query(user_query),
+            'sql': sql,
+            'rows': row_count,
+            'timings_ms': {stage: round(ms, 1) for stage, ms in timings.items()},
+        }
+        entry.update(extra)
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        try:
+            with self._lock:
+                log_file = self._open()
+                log_file.write(line)
+                log_file.flush()
+                # Size the shared path, not this handle, which may lag other writers
+                if self.max_bytes and self._shared_size() >= self.max_bytes:
+                    self._rotate()
+        except OSError as e:
+            print(f"Failed to write query log entry: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def read_entries(self):
+        """Yield logged entries from the oldest backup to the current file"""
+        paths = [f"{self.path}.{index}" for index in range(self.backup_count, 0, -1)]
+        paths.append(self.path)
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as log_file:
+                for line in log_file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # Skip lines truncated by a crash mid-write
+                        continue
+
+    def top_queries(self, limit):
+        """Return (normalized query, latest SQL, count) for the most frequent queries"""
+        counts = Counter()
+        latest_sql = {}
+        for entry in self.read_entries():
+            query = entry.get('query')
+            sql = entry.get('sql')
+            if not query or not sql:
+                continue
+            counts[query] += 1
+            latest_sql[query] = sql
+        return [(query, latest_sql[query], count) for query, count in counts.most_common(limit)]
+
+
+def build_report(query_log, limit=10):
+    """Summarize the log into the most frequent and the slowest queries"""
+    stats = {}
+    for entry in query_log.read_entries():
+        query = entry.get('query')
+        if not query:
+            continue
+        total_ms = entry.get('timings_ms', {}).get('total', 0)
+        item = stats.setdefault(query, {'query': query, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0})
+        item['count'] += 1
+        item['total_ms'] += total_ms
+        item['max_ms'] = max(item['max_ms'], total_ms)
+        item['rows'] = entry.get('rows', item['rows'])
+
+    for item in stats.values():
+        item['avg_ms'] = item['total_ms'] / item['count']
+
+    return {
+        'most_frequent': sorted(stats.values(), key=lambda item: item['count'], reverse=True)[:limit],
+        'slowest': sorted(stats.values(), key=lambda item: item['avg_ms'], reverse=True)[:limit],
+    }
+
+
+def print_report(report):
+    print("Most frequent queries:")
+    for item in report['most_frequent']:
+        print(f"  {item['count']:>6}x  avg {item['avg_ms']:>8.1f} ms  {item['rows']:>5} rows  {item['query']}")
+    print()
+    print("Slowest queries (by average total time):")
+    for item in report['slowest']:
+        print(f"  avg {item['avg_ms']:>8.1f} ms  max {item['max_ms']:>8.1f} ms  {item['count']:>6}x  {item['query']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the slowest and most frequent logged search queries')
+    parser.add_argument('path', nargs='?', default=None, help='query log path (defaults to QUERY_LOG_PATH)')
+    parser.add_argument('--top', type=int, default=10, help='number of queries to list per section')
+    args = parser.parse_args()
+
+    query_log = QueryLog(args.path)
+    if not any(os.path.exists(p) for p in [query_log.path, f"{query_log.path}.1"]):
+        print(f"No query log found at {query_log.path}")
+        sys.exit(1)
+    print_report(build_report(query_log, args.top))
@@ -8,6 +8,7 @@ export interface Property {
   StreetNumber: string;
   StreetName: string;
   City: string;
+  StateOrProvince?: string;
   BedroomsTotal: number;
   BathroomsTotalInteger: number;
   LivingArea: number;